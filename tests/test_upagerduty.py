@@ -0,0 +1,308 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import upagerduty
+
+
+class FakePagerDuty(ThreadingHTTPServer):
+    """Local stand-in for the v1 REST API, serving ``total`` incidents."""
+    daemon_threads = True
+
+    def __init__(self):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.total = 0
+        self.failing_offsets = {}
+        self.status = 200
+        self.requests = []
+        self.events = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_port
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with server.lock:
+            server.requests.append((url.path, query))
+
+        if server.status != 200:
+            self.send_json(server.status, {'error': {'code': 2000, 'message': 'Internal Error', 'errors': []}})
+        elif url.path.endswith('/entries'):
+            self.send_json(200, {'entries': [{'start': query['since'], 'end': query['until']}]})
+        else:
+            offset, limit = int(query['offset']), int(query['limit'])
+            if offset in server.failing_offsets:
+                self.send_json(server.failing_offsets[offset], {'error': {'code': 2100, 'message': 'Not Found', 'errors': ['page']}})
+                return
+            incidents = [{'id': str(i), 'incident_number': i} for i in range(offset, min(offset + limit, server.total))]
+            # Like PagerDuty, send total after the incidents
+            self.send_json(200, {'incidents': incidents, 'limit': limit, 'offset': offset, 'total': server.total})
+
+    def do_POST(self):
+        event = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.events.append(event)
+        if event['event_type'] != 'resolve' and 'description' not in event:
+            self.send_json(400, {'status': 'invalid event', 'message': 'Event object is invalid',
+                                 'errors': ['Description is missing']})
+        else:
+            self.send_json(200, {'status': 'success', 'message': 'Event processed',
+                                 'incident_key': event.get('incident_key', 'generated')})
+
+
+@pytest.fixture
+def server():
+    server = FakePagerDuty()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    monkeypatch.setattr(upagerduty, '_BREAKERS', {})
+
+
+@pytest.fixture(params=['buffered', 'ijson'])
+def decoder(request, monkeypatch):
+    if request.param == 'buffered':
+        monkeypatch.setattr(upagerduty, 'ijson', None)
+    elif upagerduty.ijson is None:
+        pytest.skip('ijson is not installed')
+    return request.param
+
+
+def incidents(server, **kwargs):
+    connection = upagerduty.Incidents('example', 'user', 'pass', **kwargs)
+    connection.base_url = server.url + '/api/v1/incidents'
+    return connection
+
+
+def schedules(server):
+    connection = upagerduty.Schedules('example', 'PSCHED', 'user', 'pass')
+    connection.base_url = server.url + '/api/v1/schedules/PSCHED/'
+    return connection
+
+
+def offsets(server):
+    return sorted(int(query['offset']) for path, query in server.requests)
+
+
+@pytest.mark.parametrize('total,pages', [(0, 1), (99, 1), (100, 1), (101, 2), (250, 3), (1000, 10)])
+def test_all_page_count_and_order(server, decoder, total, pages):
+    server.total = total
+
+    ids = [i['id'] for i in incidents(server).all('2024-01-01', '2024-02-01')]
+
+    assert ids == [str(i) for i in range(total)]
+    assert offsets(server) == [page * 100 for page in range(pages)]
+
+
+def test_all_stops_fetching_when_closed_early(server, decoder):
+    server.total = 10000
+    generator = incidents(server, max_workers=2).all('2024-01-01', '2024-02-01')
+
+    assert len(list(islice(generator, 150))) == 150
+    generator.close()
+    time.sleep(0.2)
+
+    # First page, the page being consumed and at most max_workers ahead of it
+    assert len(server.requests) <= 4
+
+
+def test_all_raises_page_error(server, decoder):
+    server.total = 500
+    server.failing_offsets = {200: 404}
+
+    with pytest.raises(upagerduty.IncidentsError) as excinfo:
+        list(incidents(server).all('2024-01-01', '2024-02-01'))
+
+    assert excinfo.value.statuscode == 2100
+    assert excinfo.value.errormessage == 'Not Found'
+
+
+def test_all_async(server):
+    if upagerduty.aiohttp is None:
+        pytest.skip('aiohttp is not installed')
+    server.total = 250
+
+    async def collect():
+        return [i['id'] async for i in incidents(server).all_async('2024-01-01', '2024-02-01')]
+
+    assert asyncio.run(collect()) == [str(i) for i in range(250)]
+
+
+def test_all_async_errors(server, monkeypatch):
+    if upagerduty.aiohttp is None:
+        pytest.skip('aiohttp is not installed')
+    server.total = 1000
+    server.failing_offsets = {300: 404}
+
+    async def collect():
+        return [i async for i in incidents(server, max_workers=2).all_async('2024-01-01', '2024-02-01')]
+
+    with pytest.raises(upagerduty.IncidentsError) as excinfo:
+        asyncio.run(collect())
+    assert excinfo.value.statuscode == 2100
+
+    monkeypatch.setattr(Handler, 'do_GET', lambda self: self.send_json(200, {'error': {'code': 2100, 'message': 'Not Found', 'errors': []}}))
+    with pytest.raises(upagerduty.IncidentsError):
+        asyncio.run(collect())
+
+
+def test_entries(server):
+    entries = schedules(server).entries('2024-01-01', '2024-02-01', overflow=True)
+
+    assert entries == [{'start': '2024-01-01', 'end': '2024-02-01'}]
+    assert server.requests == [('/api/v1/schedules/PSCHED/entries',
+                                {'since': '2024-01-01', 'until': '2024-02-01', 'overflow': 'True'})]
+
+
+def test_cookies_are_not_shared(server, monkeypatch):
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('Cookie'))
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'session=secret; Path=/')
+        self.send_header('Content-Length', '14')
+        self.end_headers()
+        self.wfile.write(b'{"entries":[]}')
+    monkeypatch.setattr(Handler, 'do_GET', do_GET)
+
+    schedules(server).entries('2024-01-01', '2024-02-01')
+    schedules(server).entries('2024-01-01', '2024-02-01')
+
+    assert server.requests == [None, None]
+    assert len(upagerduty._SESSION.cookies) == 0
+
+
+def test_error_in_successful_response(server, monkeypatch):
+    monkeypatch.setattr(Handler, 'do_GET', lambda self: self.send_json(200, {'error': {'code': 2001, 'message': 'Invalid', 'errors': ['a', 'b']}}))
+
+    with pytest.raises(upagerduty.SchedulesError) as excinfo:
+        schedules(server).entries('2024-01-01', '2024-02-01')
+
+    assert str(excinfo.value) == 'Pagerduty Schedules Error: HTTP 2001 a | b returned with message, "Invalid"'
+
+
+def test_incidents_error_in_successful_response(server, decoder, monkeypatch):
+    monkeypatch.setattr(Handler, 'do_GET', lambda self: self.send_json(200, {'error': {'code': 2100, 'message': 'Not Found', 'errors': ['page']}}))
+
+    with pytest.raises(upagerduty.IncidentsError) as excinfo:
+        list(incidents(server).all('2024-01-01', '2024-02-01'))
+
+    assert str(excinfo.value) == 'Pagerduty Incidents Error: HTTP 2100 page returned with message, "Not Found"'
+
+
+def test_streamed_response_repr(server):
+    server.total = 1
+    request = upagerduty.IncidentsRequest(incidents(server), {'since': 'a', 'until': 'b', 'limit': 100, 'offset': 0})
+
+    assert repr(request.fetch(stream=True)) == 'IncidentsResponse: <streaming>'
+
+
+def events(server):
+    connection = upagerduty.PagerDuty('SERVICEKEY')
+    connection.api_endpoint = server.url + '/generic/2010-04-15/create_event.json'
+    return connection
+
+
+def test_trigger_event(server):
+    incident_key = events(server).trigger('Disk full', details={'host': 'db1', 1: 'x'})
+
+    assert incident_key == 'generated'
+    assert server.events == [{'service_key': 'SERVICEKEY', 'event_type': 'trigger', 'description': 'Disk full',
+                              'details': {'host': 'db1', '1': 'x'}}]
+
+
+def test_resolve_event(server):
+    assert events(server).resolve('KEY1') == 'KEY1'
+    assert server.events == [{'service_key': 'SERVICEKEY', 'event_type': 'resolve', 'incident_key': 'KEY1'}]
+
+
+def test_invalid_event(server):
+    with pytest.raises(upagerduty.PagerDutyException) as excinfo:
+        events(server).acknowledge('KEY1')
+
+    assert str(excinfo.value) == 'invalid event: Event object is invalid\n* Description is missing'
+
+
+def test_transport_error_is_urlerror():
+    connection = upagerduty.Incidents('example', 'user', 'pass', timeout=1)
+    connection.base_url = 'http://127.0.0.1:1/api/v1/incidents'
+
+    with pytest.raises(upagerduty.URLError):
+        list(connection.all('2024-01-01', '2024-02-01'))
+
+
+def test_circuit_breaker_transitions():
+    breaker = upagerduty.CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    error = ValueError()
+
+    breaker.record_failure(error)
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow() == (True, None)
+
+    breaker.record_failure(error)
+    assert breaker.state == breaker.OPEN
+    assert breaker.allow() == (False, error)
+
+    time.sleep(0.06)
+    assert breaker.allow() == (True, None)
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow() == (False, error)
+
+    breaker.record_failure(error)
+    assert breaker.state == breaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow() == (True, None)
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow() == (True, None)
+    assert breaker.last_error is None
+
+
+def test_circuit_breaker_short_circuits_per_api(server):
+    server.status = 500
+    connection = schedules(server)
+    for _ in range(5):
+        with pytest.raises(upagerduty.SchedulesError):
+            connection.entries('2024-01-01', '2024-02-01')
+    assert len(server.requests) == 5
+
+    with pytest.raises(upagerduty.SchedulesError) as excinfo:
+        connection.entries('2024-01-01', '2024-02-01')
+    assert len(server.requests) == 5
+    # A fresh copy of the cached error is raised, chained to it
+    assert excinfo.value.statuscode == 2000
+    assert isinstance(excinfo.value.__cause__, upagerduty.SchedulesError)
+    assert excinfo.value.__cause__ is not excinfo.value
+
+    # Incidents on the same host has its own breaker
+    server.status = 200
+    server.total = 1
+    assert len(list(incidents(server).all('2024-01-01', '2024-02-01'))) == 1
@@ -1,43 +1,302 @@
 #!/usr/bin/env python3
 
+from functools import partial
+
 try:
-    import json
+    import orjson as _json
+    _json_loads = _json.loads
+    # Accept non-str dict keys (e.g. in event details) like the json module does
+    _json_dumps_bytes = partial(_json.dumps, option=_json.OPT_NON_STR_KEYS)
 except ImportError:
-    import simplejson as json
+    try:
+        import ujson as _json
+    except ImportError:
+        import json as _json
+    _json_loads = _json.loads
 
-from urllib.error import HTTPError
-from urllib.parse import urlencode
-from urllib.request import Request
-from urllib.request import urlopen
+    def _json_dumps_bytes(obj):
+        return _json.dumps(obj).encode('utf-8')
 
-import base64
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
 
+import asyncio
+import base64
+import http.cookiejar
+import io
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from upagerduty._errors import parse_error as _parse_error
 from upagerduty.version import VERSION
 
 __version__ = VERSION
 
-class SchedulesError(HTTPError):
+# Shared across all connections so that consecutive calls (e.g. the pages of
+# Incidents.all) reuse the same keep-alive TCP/TLS connection.
+# Idempotent GETs are retried with exponential backoff on throttling and
+# server errors; event POSTs are never retried.
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class _FullJitterRetry(Retry):
+    """Retry sleeping a random time between zero and the exponential backoff ("full jitter")."""
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+_RETRY = _FullJitterRetry(total=5, backoff_factor=0.5, status_forcelist=_RETRY_STATUSES,
+                          allowed_methods=['GET'], raise_on_status=False)
+_SESSION = requests.Session()
+# Share connections only: never keep cookies between (differently authenticated) connections
+_SESSION.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=_RETRY))
+_SESSION.mount('https://events.pagerduty.com/', HTTPAdapter(max_retries=0))
+
+def _http_error(response):
+    """Convert an unsuccessful :class:`requests.Response` to an :class:`HTTPError`."""
+    return HTTPError(response.url, response.status_code, response.reason, response.headers, io.BytesIO(response.content))
+
+def _iter_incidents(fp, page):
+    """ Incrementally decode an incidents page from the file-like ``fp``.
+
+        Incidents are yielded as soon as each one is parsed. Other top level
+        scalars (``total``, ``limit``, ...) and the ``error`` object, if any,
+        are stored in ``page`` as they are seen.
+    """
+    builder = None
+    complete = False
+    try:
+        for prefix, event, value in ijson.parse(fp, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == builder_prefix and event == 'end_map':
+                    if builder_prefix == 'error':
+                        page['error'] = builder.value
+                    else:
+                        yield builder.value
+                    builder = None
+            elif prefix in ('incidents.item', 'error') and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+                builder_prefix = prefix
+                builder.event(event, value)
+            elif '.' not in prefix and event in ('number', 'string', 'boolean', 'null'):
+                page[prefix] = value
+        fp.drain_conn()
+        complete = True
+    finally:
+        # A connection with an unread body cannot be reused, drop it
+        if not complete:
+            fp.close()
+        fp.release_conn()
+
+class CircuitBreaker(object):
+    """ Fail fast while a host keeps failing.
+
+        After ``failure_threshold`` consecutive failures the breaker opens and
+        raises a copy of the last error without touching the network. Once
+        ``reset_timeout`` seconds have passed a single probe request is let
+        through (half open); its outcome closes or re-opens the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """ Return ``(allowed, last_error)``: whether a request may be sent and,
+            if not, the error that opened the breaker. Both are read under the lock.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True, None
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True, None
+            return False, self.last_error
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.last_error = None
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def _circuit_breaker(url, error_cls):
+    """Return the :class:`CircuitBreaker` for the host of ``url`` and API ``error_cls``."""
+    key = (urlsplit(url).netloc, error_cls)
+    with _BREAKERS_LOCK:
+        if key not in _BREAKERS:
+            _BREAKERS[key] = CircuitBreaker()
+        return _BREAKERS[key]
+
+def _do_get(session, base_url, params, auth_header, timeout, error_cls, stream=False):
+    """ Send a GET request to a Pagerduty REST API resource.
+
+        Goes through the circuit breaker of the API host. Unsuccessful responses
+        are raised as ``error_cls``.
+
+        :rtype: :class:`requests.Response`
+    """
+    breaker = _circuit_breaker(base_url, error_cls)
+    allowed, last_error = breaker.allow()
+    if not allowed:
+        # The cached error may be raised from several threads, never raise it directly
+        if isinstance(last_error, _ApiError):
+            raise last_error.copy() from last_error
+        raise URLError(last_error.reason) from last_error
+
+    try:
+        response = session.get(base_url, params=params, headers={"Authorization": auth_header},
+                               timeout=timeout, stream=stream)
+    except requests.RequestException as e:
+        # Keep raising URLError for transport failures, as urlopen did
+        error = URLError(e)
+        breaker.record_failure(error)
+        raise error from e
+
+    if not response.ok:
+        error = error_cls(_http_error(response))
+        if response.status_code in _RETRY_STATUSES:
+            breaker.record_failure(error)
+        else:
+            breaker.record_success()
+        raise error
+
+    breaker.record_success()
+    return response
+
+class _ApiError(HTTPError):
+    api_name = 'API'
+
     def __init__(self, http_error):
         HTTPError.__init__(self, http_error.filename, http_error.code, http_error.msg, http_error.hdrs, http_error.fp)
 
+        self.statuscode = http_error.code
+        self.statusdesc = http_error.msg
+        self.errormessage = ''
+        self.body = b''
+
         try:
-            data = self.read()
+            data = self.body = self.read()
         
-            j = json.loads(data)
-            error = j['error']
-            self.statuscode = error['code']
-            self.statusdesc = ' | '.join(error.get('errors', []))
-            self.errormessage = error['message']
+            self.statuscode, self.statusdesc, self.errormessage = _parse_error(_json_loads(data))
         except:
             pass
 
+        # The error does not change after this point, format it only once
+        self._repr = f'Pagerduty {self.api_name} Error: HTTP {self.statuscode} {self.statusdesc} returned with message, "{self.errormessage}"'
+
+    def copy(self):
+        """Return a new, not yet raised, error for the same response."""
+        return type(self)(HTTPError(self.filename, self.code, self.msg, self.hdrs, io.BytesIO(self.body)))
+
     def __repr__(self):
-        return 'Pagerduty Schedules Error: HTTP {0} {1} returned with message, "{2}"'.format(self.statuscode, self.statusdesc, self.errormessage)
+        return self._repr
 
     def __str__(self):
-        return self.__repr__()
+        return self._repr
+
+class _ApiRequest(object):
+    error_cls = _ApiError
+    response_cls = None
+
+    def __init__(self, connection, url, params):
+        self.url = url
+        self.params = params
+        self.timeout = connection.timeout
+        self.auth_header = connection.auth_header
+
+    def get_method(self):
+        return 'GET'
+
+    def get_full_url(self):
+        return self.url + '?' + urlencode(self.params)
+
+    def __repr__(self):
+        return f'{type(self).__name__}: {self.get_method()} {self.get_full_url()}'
+
+    def fetch(self, stream=False):
+        """Execute the request.
+
+        :type stream: boolean
+        :param stream: if True the response body is left unread, see :class:`_ApiResponse`
+        """
+        response = _do_get(_SESSION, self.url, self.params, self.auth_header, self.timeout, self.error_cls, stream)
+        return self.response_cls(response, stream)
+
+class _ApiResponse(object):
+    error_cls = _ApiError
+
+    def __init__(self, response, stream=False):
+        """Representation of a Pagerduty API HTTP response.
+
+        When ``stream`` is set the body is not read: ``data`` is a file-like
+        object over the raw socket and ``content`` is None.
+        """
+        self.headers = response.headers
+
+        if stream:
+            response.raw.decode_content = True
+            self.data = response.raw
+            self.content = None
+            return
+
+        self.data = response.content
+        self.content = _json_loads(self.data)
+
+        if 'error' in self.content:
+            raise self.error_cls(_http_error(response))
+
+    def __repr__(self):
+        if self.content is None:
+            return f'{type(self).__name__}: <streaming>'
+        return f'{type(self).__name__}: {list(self.content.items())}'
+
+class SchedulesError(_ApiError):
+    api_name = 'Schedules'
+
+class SchedulesResponse(_ApiResponse):
+    error_cls = SchedulesError
+
+class SchedulesRequest(_ApiRequest):
+    error_cls = SchedulesError
+    response_cls = SchedulesResponse
 
-class SchedulesRequest(Request):
     def __init__(self, connection, resource, params):
         """Representation of a Pagerduty Schedules API HTTP request.
         
@@ -51,54 +310,19 @@ class SchedulesRequest(Request):
         :param params: Params to be sent with a GET request
         
         """
-
-        encoded_params = urlencode(params)
-        url = connection.base_url + resource + '?' + encoded_params
-        Request.__init__(self, url)
-
-        # Add auth header
-        base64string = base64.encodestring('%s:%s' % (connection.username, connection.password)).replace('\n','')
-        self.add_header("Authorization", "Basic %s" % base64string)
-
-    
-    def __repr__(self):
-        return 'SchedulesRequest: {0} {1}' % (self.get_method(), self.get_full_url())
-        
-        
-    def fetch(self):
-        """Execute the request."""
-        try:
-            response = urlopen(self)
-        except HTTPError as e:
-            raise SchedulesError(e)
-        else:
-            return SchedulesResponse(response)
-        
-
-class SchedulesResponse(object):
-    def __init__(self, response):
-        """Representation of a Pagerduty Schedules API HTTP response."""
-        self.data = response.read()
-
-        self.headers = response.headers
-        self.content = json.loads(self.data)
-        
-        if 'error' in self.content:
-            raise SchedulesError(self.content)
-
-
-    def __repr__(self):
-        return 'SchedulesResponse: {0}'.format(list(self.content.items()))
+        _ApiRequest.__init__(self, connection, connection.base_url + resource, params)
 
 class Schedules(object):
     """ Interface to Pagerduty Schedule API.
     """
-    def __init__(self, subdomain, schedule_id, username, password):
+    def __init__(self, subdomain, schedule_id, username, password, timeout=15):
 
         self.username = username
         self.password = password
+        self.auth_header = 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+        self.timeout = timeout
 
-        self.base_url = 'https://{0}.pagerduty.com/api/v1/schedules/{1}/'.format(subdomain, schedule_id)
+        self.base_url = f'https://{subdomain}.pagerduty.com/api/v1/schedules/{schedule_id}/'
 
     def entries(self, since, until, overflow=False):
         """ Query schedule entries.  
@@ -144,9 +368,12 @@ class PagerDutyException(Exception):
         return txt
 
 class PagerDuty(object):
+    EVENTS_API_URL = "events.pagerduty.com/generic/2010-04-15/create_event.json"
+    _HEADERS = {"Content-Type": "application/json"}
+
     def __init__(self, service_key, https=True, timeout=15):
         self.service_key = service_key
-        self.api_endpoint = ("http", "https")[https] + "://events.pagerduty.com/generic/2010-04-15/create_event.json"
+        self.api_endpoint = f"{'https' if https else 'http'}://{self.EVENTS_API_URL}"
         self.timeout = timeout
     
     def trigger(self, description, incident_key=None, details=None):
@@ -158,23 +385,21 @@ class PagerDuty(object):
     def resolve(self, incident_key, description=None, details=None):
         return self._request("resolve", description=description, incident_key=incident_key, details=details)
     
-    def _request(self, event_type, **kwargs):
-        event = {
-            "service_key": self.service_key,
-            "event_type": event_type,
-        }
-        for k, v in kwargs.items():
-            if v is not None:
-                event[k] = v
-        encoded_event = json.dumps(event).encode('utf-8')
+    def _request(self, event_type, description=None, incident_key=None, details=None):
+        event = {k: v for k, v in (("service_key", self.service_key),
+                                   ("event_type", event_type),
+                                   ("description", description),
+                                   ("incident_key", incident_key),
+                                   ("details", details)) if v is not None}
+        encoded_event = _json_dumps_bytes(event)
         try:
-            res = urlopen(self.api_endpoint, encoded_event, self.timeout)
-        except HTTPError as exc:
-            if exc.code != 400:
-                raise
-            res = exc
+            res = _SESSION.post(self.api_endpoint, data=encoded_event, timeout=self.timeout, headers=self._HEADERS)
+        except requests.RequestException as e:
+            raise URLError(e) from e
+        if not res.ok and res.status_code != 400:
+            raise _http_error(res)
         
-        result = json.loads(res.read())
+        result = _json_loads(res.content)
         
         if result['status'] != "success":
             raise PagerDutyException(result['status'], result['message'], result['errors'])
@@ -183,32 +408,16 @@ class PagerDuty(object):
         
         return result.get('incident_key')
 
-class IncidentsError(HTTPError):
-    def __init__(self, http_error):
-        HTTPError.__init__(self, http_error.filename, http_error.code, http_error.msg, http_error.hdrs, http_error.fp)
+class IncidentsError(_ApiError):
+    api_name = 'Incidents'
 
-        self.statuscode = http_error.code
-        self.statusdesc = http_error.msg
-        self.errormessage = ''
+class IncidentsResponse(_ApiResponse):
+    error_cls = IncidentsError
 
-        try:
-            data = self.read()
-        
-            j = json.loads(data)
-            error = j['error']
-            self.statuscode = error['code']
-            self.statusdesc = ' | '.join(error.get('errors', []))
-            self.errormessage = error['message']
-        except:
-            pass
-
-    def __repr__(self):
-        return 'Pagerduty Incidents Error: HTTP {0} {1} returned with message, "{2}"'.format(self.statuscode, self.statusdesc, self.errormessage)
+class IncidentsRequest(_ApiRequest):
+    error_cls = IncidentsError
+    response_cls = IncidentsResponse
 
-    def __str__(self):
-        return self.__repr__()
-
-class IncidentsRequest(Request):
     def __init__(self, connection, params):
         """Representation of a Pagerduty Incidents API HTTP request.
 
@@ -219,61 +428,53 @@ class IncidentsRequest(Request):
         :param params: Params to be sent with a GET request
 
         """
-
-        encoded_params = urlencode(params)
-        url = connection.base_url + '?' + encoded_params
-        Request.__init__(self, url)
-
-        # Add auth header
-        base64string = base64.encodestring('%s:%s' % (connection.username, connection.password)).replace('\n','')
-        self.add_header("Authorization", "Basic %s" % base64string)
-
-    def __repr__(self):
-        return 'IncidentsRequest: {0} {1}' % (self.get_method(), self.get_full_url())
-
-    def fetch(self):
-        """Execute the request."""
-        try:
-            response = urlopen(self)
-        except HTTPError as e:
-            raise IncidentsError(e)
-        else:
-            return IncidentsResponse(response)
-
-class IncidentsResponse(object):
-    def __init__(self, response):
-        """Representation of a Pagerduty Incidents API HTTP response."""
-        self.data = response.read()
-
-        self.headers = response.headers
-        self.content = json.loads(self.data)
-
-        if 'error' in self.content:
-            raise IncidentsError(self.content)
-
-    def __repr__(self):
-        return 'IncidentsResponse: {0}'.format(list(self.content.items()))
+        _ApiRequest.__init__(self, connection, connection.base_url, params)
 
 class Incidents(object):
     """ Interface to Pagerduty Incident API.
     """
-    def __init__(self, subdomain, username, password):
+    def __init__(self, subdomain, username, password, timeout=15, max_workers=8):
         self.username = username
         self.password = password
-        self.base_url = 'https://{0}.pagerduty.com/api/v1/incidents'.format(subdomain)
+        self.auth_header = 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.base_url = f'https://{subdomain}.pagerduty.com/api/v1/incidents'
 
-    def _make_request(self, since, until, limit, offset):
+    def _request(self, since, until, limit, offset, stream=False):
         params = {'since' : since, 'until' : until, 'limit' : limit, 'offset' : offset}
 
         request = IncidentsRequest(self, params)
-        response = request.fetch()
+        return request.fetch(stream)
+
+    def _make_request(self, since, until, limit, offset):
+        response = self._request(since, until, limit, offset)
 
         return response.content['total'], response.content['incidents']
 
+    def _stream_page(self, since, until, limit, offset, page):
+        """Request a page and yield its incidents as they are decoded (requires ijson)."""
+        fp = self._request(since, until, limit, offset, stream=True).data
+
+        yield from _iter_incidents(fp, page)
+
+        if 'error' in page:
+            body = _json_dumps_bytes({'error': page['error']})
+            raise IncidentsError(HTTPError(fp.url, fp.status, fp.reason, fp.headers, io.BytesIO(body)))
+
+    def _fetch_page(self, since, until, limit, offset):
+        # Runs in a worker thread: read and decode the whole page there, so that
+        # no connection is held open waiting for the consumer.
+        return self._make_request(since, until, limit, offset)[1]
+
     def all(self, since, until):
         """ Query incidents.
             The maximum range queryable at once is 100 incidents.
             This function returns an iterator that handles pagination for you.
+            Pages after the first are fetched concurrently, at most ``max_workers``
+            pages ahead of the one being consumed.
+            If ijson is installed the first page is decoded and yielded incident by
+            incident while it is still downloading.
 
             :type since: string
             :param since: date in ISO 8601 format, the time element is optional 
@@ -285,15 +486,88 @@ class Incidents(object):
         """
         limit = 100
 
-        total, incidents = self._make_request(since, until, limit, 0)
+        if ijson is None:
+            total, incidents = self._make_request(since, until, limit, 0)
+            yield from incidents
+        else:
+            page = {}
+            yield from self._stream_page(since, until, limit, 0, page)
+            total = page['total']
+
+        num_pages = (total + limit - 1) // limit
+        if num_pages > 1:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            try:
+                # Keep at most max_workers pages in flight ahead of the consumer
+                # and yield in page order while the following ones download.
+                pages = iter(range(1, num_pages))
+                futures = deque(executor.submit(self._fetch_page, since, until, limit, page * limit)
+                                for page in islice(pages, self.max_workers))
+                while futures:
+                    incidents = futures.popleft().result()
+                    for page in islice(pages, 1):
+                        futures.append(executor.submit(self._fetch_page, since, until, limit, page * limit))
+                    yield from incidents
+            finally:
+                # Do not download the rest when the caller stops early or a page failed
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _fetch_page_async(self, session, semaphore, since, until, limit, offset):
+        params = {'since' : since, 'until' : until, 'limit' : limit, 'offset' : offset}
+        headers = {"Authorization": self.auth_header}
+
+        # Wait for a slot first so the timeout only covers the request itself
+        async with semaphore:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with session.get(self.base_url, params=params, headers=headers, timeout=timeout) as response:
+                data = await response.read()
+
+        content = None if response.status >= 400 else _json_loads(data)
+        if content is None or 'error' in content:
+            raise IncidentsError(HTTPError(str(response.url), response.status, response.reason,
+                                           response.headers, io.BytesIO(data)))
+
+        return content
+
+    async def all_async(self, since, until):
+        """ Asynchronous version of :meth:`all`, requires aiohttp.
+            Returns an async iterator; pages after the first are requested at once
+            (at most ``max_workers`` at a time) and each one is decoded as soon as it arrives.
+            Unlike :meth:`all`, failed requests are not retried and do not go
+            through the circuit breaker; the first failing page raises :class:`IncidentsError`.
+
+            :type since: string
+            :param since: date in ISO 8601 format, the time element is optional 
+            (ie. '2011-05-06' is understood as at midnight ) 
 
-        for i in incidents:
-            yield i
+            :type until: string
+            :param until: date in ISO 8601 format, the time element is optional 
+            (ie. '2011-05-06' is understood as at midnight )
+        """
+        if aiohttp is None:
+            raise ImportError('Incidents.all_async requires aiohttp')
 
-        if total > limit:
-            num_pages = (total / limit) + 1
-            for page in range(1, num_pages):
-                offset = page * limit
-                total, incidents = self._make_request(since, until, limit, offset)
-                for i in incidents:
-                    yield i
+        limit = 100
+        connector = aiohttp.TCPConnector(limit=self.max_workers)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            content = await self._fetch_page_async(session, semaphore, since, until, limit, 0)
+            for i in content['incidents']:
+                yield i
+
+            num_pages = (content['total'] + limit - 1) // limit
+            if num_pages > 1:
+                tasks = [asyncio.ensure_future(self._fetch_page_async(session, semaphore, since, until, limit, page * limit))
+                         for page in range(1, num_pages)]
+                try:
+                    pages = await asyncio.gather(*tasks)
+                except BaseException:
+                    # Do not leave the other pages running against a closing session
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+                for content in pages:
+                    for i in content['incidents']:
+                        yield i
@@ -0,0 +1,16 @@
+"""Parsing of Pagerduty REST API error bodies.
+
+Fully annotated and free of package imports so that it can be compiled with
+mypyc (see the ``mypyc`` build hook in pyproject.toml).
+"""
+
+from typing import Any, Dict, List, Tuple
+
+
+def parse_error(content: Dict[str, Any]) -> Tuple[int, str, str]:
+    """Return the code, joined error list and message of a decoded error body."""
+    error: Dict[str, Any] = content['error']
+    errors: List[str] = error.get('errors', [])
+    code: int = error['code']
+    message: str = error['message']
+    return code, ' | '.join(errors), message